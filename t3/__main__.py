@@ -5,12 +5,10 @@ logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
 
 import os
 import csv
-import sox
-import glob
 import shutil
 import argparse
 import subprocess
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 from . import s2st, audio_utils
 
@@ -28,6 +26,16 @@ def main() -> None:
                         help="Skip the translation step (useful for debugging when the translation has happened in previous runs)")
     parser.add_argument("--force_cpu", action="store_true",
                         help="Force the inference to happen on CPU, even if a GPU is available (useful for testing on low-end GPUs)")
+    parser.add_argument("--batch_size", type=int, default=4,
+                        help="Number of audio files translated at once, lower it when running out of (GPU) memory")
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"],
+                        help="Inference precision, by default FP16 is used on GPU and FP32 on CPU. INT8 (CPU only) quantizes weights of linear layers, which trades accuracy for speed")
+    parser.add_argument("--convert_with_ffmpeg", action="store_true",
+                        help="Convert translated audio files into OGG with ffmpeg subprocesses instead of in-process (slower)")
+    parser.add_argument("--compile", action="store_true",
+                        help="Compile the models with torch.compile for a faster GPU inference, useful for GME files with many audio files")
+    parser.add_argument("--fbank_cache_dir",
+                        help="Cache extracted audio features in this directory, repeated translations of the same files skip audio decoding (useful for debugging)")
 
     args = parser.parse_args()
 
@@ -48,15 +56,15 @@ def main() -> None:
     log.info(f"{len(too_long)} audio files will not be translated because of their duration")
 
     # Copy too long audio files into the final directory - these will be intact
-    [shutil.copy(p, final_dir) for p in too_long]  # pylint: disable=expression-not-assigned
+    copy_files(too_long, final_dir)
     log.info(f"Copied too long audios into the '{final_dir}'")
 
     # Detect speech in the normal length audio files
-    speech, sounds = split_by_speech(normal_length)
+    speech, sounds = split_by_speech(normal_length, force_cpu=args.force_cpu)
     log.info(f"Voice was detected in {len(speech)} files, {len(sounds)} files contain only non-voice sounds")
 
     # Copy audio files without voice into the final directory - these will be intact
-    [shutil.copy(p, final_dir) for p in sounds]  # pylint: disable=expression-not-assigned
+    copy_files(sounds, final_dir)
     log.info(f"Copied audios without speech into the '{final_dir}'")
 
     # Translate normal-length audio files with voice
@@ -69,10 +77,12 @@ def main() -> None:
             raise ValueError("No translated audio files were found (--skip_translation was used)")
     else:
         log.info(f"Translating {len(speech)} audio files")
-        translated = s2st.translate_audio_files(speech, translated_dir, force_cpu=args.force_cpu)
+        translated = s2st.translate_audio_files(speech, translated_dir, batch_size=args.batch_size,
+                                                compile_model=args.compile, precision=args.precision,
+                                                fbank_cache_dir=args.fbank_cache_dir, force_cpu=args.force_cpu)
 
     # Convert mp3 into ogg
-    convert_to_ogg(translated, final_dir)
+    convert_to_ogg(translated, final_dir, use_ffmpeg=args.convert_with_ffmpeg)
     log.info(f"Converted translated mp3 files into ogg files in '{final_dir}'")
 
     # Build report
@@ -147,7 +157,19 @@ def extract_ogg(input_gme_path: str, extracted_dir: str) -> list[str]:
         if exc.returncode == 1:
             pass
 
-    return glob.glob(os.path.join(extracted_dir, "*.ogg"))
+    # libtiptoi lists extracted files in a filelist, which saves scanning the directory
+    filelist_path = os.path.join(extracted_dir, "filelist.txt")
+    ogg_paths: list[str] = []
+
+    if os.path.exists(filelist_path):
+        with open(filelist_path, encoding="utf-8") as f:
+            ogg_paths = [os.path.normpath(line.strip()) for line in f if line.strip().endswith(".ogg")]
+
+    # Fall back to a directory scan if the filelist is missing or its format is unexpected
+    if not ogg_paths or not os.path.exists(ogg_paths[0]):
+        ogg_paths = [entry.path for entry in os.scandir(extracted_dir) if entry.name.endswith(".ogg")]
+
+    return ogg_paths
 
 
 def split_by_length(paths: list[str]) -> tuple[list[str], list[str]]:
@@ -162,14 +184,16 @@ def split_by_length(paths: list[str]) -> tuple[list[str], list[str]]:
     Returns:
         `normal_length, too_long` - a tuple of two lists of paths, `too_long` containing paths to files which were above the duration limit
     """
-    ok_length = [audio_utils.check_audio_length(p) for p in paths]
-    normal_length = [pair[1] for pair in zip(ok_length, paths) if pair[0]]
-    too_long = [pair[1] for pair in zip(ok_length, paths) if not pair[0]]
+    normal_length: list[str] = []
+    too_long: list[str] = []
+
+    for path in paths:
+        (normal_length if audio_utils.check_audio_length(path) else too_long).append(path)
 
     return normal_length, too_long
 
 
-def split_by_speech(paths: list[str]) -> tuple[list[str], list[str]]:
+def split_by_speech(paths: list[str], force_cpu: bool = False) -> tuple[list[str], list[str]]:
     """Split audio files in `paths` based on the voice activity detection (VAD) into two lists which are returned.
 
     This is useful for isolating audio files with (can be translated) and without (shouldn't be translated) human speech.
@@ -177,21 +201,31 @@ def split_by_speech(paths: list[str]) -> tuple[list[str], list[str]]:
 
     Args:
         paths: Input paths
+        force_cpu: Force the VAD to run on CPU even if a GPU is available
 
     Returns:
         `speech, sounds` - a tuple of two lists of paths, `speech` containing paths to files with detected speech
     """
-    # Use multiple processes to speed this up
-    with ProcessPoolExecutor() as e:
-        has_voice_it = e.map(audio_utils.detect_speech, paths)
+    speech: list[str] = []
+    sounds: list[str] = []
 
-    has_voice = list(has_voice_it)
-    speech = [pair[1] for pair in zip(has_voice, paths) if pair[0]]
-    sounds = [pair[1] for pair in zip(has_voice, paths) if not pair[0]]
+    for has_voice, path in zip(audio_utils.detect_speech_batch(paths, force_cpu=force_cpu), paths):
+        (speech if has_voice else sounds).append(path)
 
     return speech, sounds
 
 
+def copy_files(paths: list[str], destination_dir: str) -> None:
+    """Copy files in `paths` into `destination_dir`, in parallel.
+
+    Args:
+        paths: Paths of files to be copied
+        destination_dir: Destination directory path
+    """
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as e:
+        list(e.map(lambda p: shutil.copy(p, destination_dir), paths))
+
+
 def read_translated_from_disk(paths: list[str], translated_dir: str) -> list[s2st.TranslatedAudio]:
     """Read already translated audio files from the disk in `translated_dir` (produced by a previous run).
 
@@ -218,12 +252,13 @@ def read_translated_from_disk(paths: list[str], translated_dir: str) -> list[s2s
     return out
 
 
-def convert_to_ogg(translated: list[s2st.TranslatedAudio], final_dir: str) -> None:
+def convert_to_ogg(translated: list[s2st.TranslatedAudio], final_dir: str, use_ffmpeg: bool = False) -> None:
     """Convert translated mp3 files in `translated` into TipToi-compatible OGG files, in `final_dir`.
 
     Args:
         translated: Paths to files to be converted into OGG
         final_dir: Destination directory path
+        use_ffmpeg: Convert with ffmpeg subprocesses instead of in-process
     """
     with ThreadPoolExecutor() as e:
         for t in translated:
@@ -233,7 +268,7 @@ def convert_to_ogg(translated: list[s2st.TranslatedAudio], final_dir: str) -> No
             file_name_base, _ = os.path.splitext(file_name)
             out_path = os.path.join(final_dir, f"{file_name_base}.ogg")
 
-            e.submit(audio_utils.convert_mp3_to_ogg, in_path, out_path)
+            e.submit(audio_utils.convert_mp3_to_ogg, in_path, out_path, use_ffmpeg=use_ffmpeg)
 
 
 def csv_report(ogg_paths: list[str], too_long: list[str], speech: list[str], translated: list[s2st.TranslatedAudio], work_dir: str) -> str:  # pylint: disable=too-many-locals
@@ -249,27 +284,27 @@ def csv_report(ogg_paths: list[str], too_long: list[str], speech: list[str], tra
     Returns:
         File path of the CSV report
     """
+    # Lookup structures
+    too_long_set = set(too_long)
+    speech_set = set(speech)
+    translated_by_name = {os.path.splitext(os.path.basename(tr.path))[0]: tr.text for tr in translated}
+
     # Create rows
     rows = []
 
     for ogg in sorted(ogg_paths):
-        filename = os.path.basename(ogg)
-        name, _ = os.path.splitext(filename)
+        name, _ = os.path.splitext(os.path.basename(ogg))
 
-        duration = sox.file_info.duration(ogg)
+        duration = audio_utils.get_duration(ogg)
 
-        if ogg in too_long:
+        if ogg in too_long_set:
             category = "Too long"
-        elif ogg in speech:
+        elif ogg in speech_set:
             category = "Speech"
         else:
             category = "Sound"
 
-        text = ""
-        for tr in translated:
-            if name in tr.path:
-                text = tr.text
-                break
+        text = translated_by_name.get(name, "")
 
         rows.append((name, duration, category, text))
 
@@ -1,27 +1,157 @@
 """Various audio utilities."""
 
-import sox
+import os
+import math
+import functools
+import onnxruntime
+import importlib.resources
+import soundfile
 import subprocess
+import torchaudio
 import silero_vad
+from torch.nn.functional import pad
+from torch.nn.utils.rnn import pad_sequence
 
 
-MODEL = silero_vad.load_silero_vad()
+CHUNK_SIZE = 512  # Number of samples the VAD model processes at once (at 16 kHz)
+DURATION_CACHE: dict[tuple[str, float], float] = {}  # Audio durations keyed by path and modification time, filled by `get_duration()`
+SPEECH_CACHE: dict[tuple[str, int, float], bool] = {}  # Speech detections keyed by path, modification time and threshold, filled by `detect_speech*()`
 
 
-def detect_speech(audio_path: str, threshold: float = 0.8) -> bool:
+@functools.cache
+def get_vad_model(force_cpu: bool = False) -> silero_vad.utils_vad.OnnxWrapper:
+    """Load the Silero VAD model on the first call, subsequent calls reuse it. ONNX model is used as it supports batched inference.
+
+    The model runs on GPU if ONNX Runtime has CUDA support (the `onnxruntime-gpu` package is installed).
+
+    Args:
+        force_cpu: Force CPU inference even if a GPU is available
+
+    Returns:
+        Silero VAD model
+    """
+    model = silero_vad.load_silero_vad(onnx=True)
+
+    # Silero's wrapper limits the session to a single thread, batched inference on CPU benefits from all cores
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = os.cpu_count() or 1
+
+    providers = ["CPUExecutionProvider"]
+
+    if not force_cpu and "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        providers.insert(0, "CUDAExecutionProvider")
+
+    model_path = str(importlib.resources.files("silero_vad.data").joinpath("silero_vad.onnx"))
+    model.session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=providers)
+
+    return model
+
+
+def detect_speech(audio_path: str, threshold: float = 0.8, force_cpu: bool = False) -> bool:
     """Detect human speech in the audio in `audio_path`, given some confidence `threshold`.
 
+    Results are cached, repeated calls on an unmodified file do not run the VAD model again.
+
     Args:
         audio_path: Path to the audio file
         threshold: Detection confidence threshold
+        force_cpu: Force CPU inference even if a GPU is available
+
+    Returns:
+        Whether a speech was detected or not
+    """
+    key = (audio_path, os.stat(audio_path).st_mtime_ns, threshold)
+
+    if key not in SPEECH_CACHE:
+        audio = silero_vad.read_audio(audio_path)
+        speech_timestamps = silero_vad.get_speech_timestamps(audio, get_vad_model(force_cpu), threshold=threshold, return_seconds=True)
+        SPEECH_CACHE[key] = bool(speech_timestamps)
+
+    return SPEECH_CACHE[key]
+
+
+def detect_speech_batch(audio_paths: list[str], threshold: float = 0.8, batch_size: int = 16, force_cpu: bool = False) -> list[bool]:
+    """Detect human speech in audio files in `audio_paths`, given some confidence `threshold`. This is a faster, batched version of `detect_speech()`.
+
+    Results are cached (shared with `detect_speech()`), only files without a cached result are processed by the VAD model.
+
+    Args:
+        audio_paths: Paths to the audio files
+        threshold: Detection confidence threshold
+        batch_size: Number of audio files processed by the VAD model at once
+        force_cpu: Force CPU inference even if a GPU is available
+
+    Returns:
+        Whether a speech was detected or not, for each file in `audio_paths`
+    """
+    keys = [(p, os.stat(p).st_mtime_ns, threshold) for p in audio_paths]
+
+    # Files are sorted by duration, so that each batch holds files of a similar length, which minimizes padding
+    order = sorted((i for i, key in enumerate(keys) if key not in SPEECH_CACHE), key=lambda i: get_duration(audio_paths[i]))
+
+    for start in range(0, len(order), batch_size):
+        audios = {i: silero_vad.read_audio(audio_paths[i]) for i in order[start:start + batch_size]}
+
+        # Empty audio has no speech, it's not passed to the VAD model (which can't process it)
+        SPEECH_CACHE.update((keys[i], False) for i, audio in audios.items() if len(audio) == 0)
+        audios = {i: audio for i, audio in audios.items() if len(audio) > 0}
+
+        if not audios:
+            continue
+
+        # The VAD model rejects inputs shorter than a single chunk, so a batch of short audio is padded up to it
+        batch = pad_sequence(list(audios.values()), batch_first=True)
+        batch = pad(batch, (0, max(0, CHUNK_SIZE - batch.shape[1])))
+        batch_probs = get_vad_model(force_cpu).audio_forward(batch, sr=16_000)
+
+        for (i, audio), probs in zip(audios.items(), batch_probs):
+            num_chunks = math.ceil(len(audio) / CHUNK_SIZE)  # Ignore probabilities of the padding
+            SPEECH_CACHE[keys[i]] = has_speech(probs[:num_chunks].tolist(), len(audio), threshold)
+
+    return [SPEECH_CACHE[key] for key in keys]
+
+
+def has_speech(speech_probs: list[float], audio_length: int, threshold: float = 0.8, *,
+               min_speech_samples: int = 4_000, min_silence_samples: int = 1_600) -> bool:
+    """Decide whether an audio contains speech, given the VAD model's per-chunk speech probabilities.
+
+    This follows `silero_vad.get_speech_timestamps()` post-processing (with its default settings), but stops at the first speech segment.
+
+    Args:
+        speech_probs: Speech probabilities for each chunk (of `CHUNK_SIZE` samples) of the audio
+        audio_length: Number of samples in the audio
+        threshold: Detection confidence threshold
+        min_speech_samples: Shorter speech segments are discarded
+        min_silence_samples: Minimum silence length which ends a speech segment
 
     Returns:
         Whether a speech was detected or not
     """
-    audio = silero_vad.read_audio(audio_path)
-    speech_timestamps = silero_vad.get_speech_timestamps(audio, MODEL, threshold=threshold, return_seconds=True)
+    neg_threshold = threshold - 0.15
+    speech_start: int | None = None
+    silence_start: int | None = None
+
+    for i, prob in enumerate(speech_probs):
+        position = i * CHUNK_SIZE
 
-    return bool(speech_timestamps)
+        if prob >= threshold:
+            silence_start = None
+
+            if speech_start is None:
+                speech_start = position
+        elif prob < neg_threshold and speech_start is not None:
+            if silence_start is None:
+                silence_start = position
+
+            if position - silence_start >= min_silence_samples:
+                if silence_start - speech_start > min_speech_samples:
+                    return True
+
+                speech_start = None
+                silence_start = None
+
+    return speech_start is not None and audio_length - speech_start > min_speech_samples
 
 
 def check_audio_length(audio_path: str, max_length: float = 50) -> bool:
@@ -37,16 +167,50 @@ def check_audio_length(audio_path: str, max_length: float = 50) -> bool:
     Returns:
         `True` if audio is within the duration limit, `False` if not
     """
-    length = sox.file_info.duration(audio_path)
+    return get_duration(audio_path) <= max_length
+
+
+def get_duration(audio_path: str) -> float:
+    """Get duration of the audio file in `audio_path`. Only the file header is read and the result is cached, so repeated calls are cheap.
+
+    Args:
+        audio_path: Path to the audio file
+
+    Raises:
+        ValueError: When the audio duration could not be determined
+
+    Returns:
+        Duration in seconds
+    """
+    key = (audio_path, os.path.getmtime(audio_path))
+
+    if key not in DURATION_CACHE:
+        try:
+            info = soundfile.info(audio_path)
+        except RuntimeError as exc:
+            raise ValueError(f"'{audio_path}': audio length could not be determined") from exc
+
+        DURATION_CACHE[key] = info.frames / info.samplerate
 
-    if length is None:
-        raise ValueError(f"'{audio_path}': audio length could not be determined")
+    return DURATION_CACHE[key]
 
-    return length <= max_length
 
+@functools.cache
+def get_resampler(orig_freq: int, new_freq: int = 16_000) -> torchaudio.transforms.Resample:
+    """Get a resampler from `orig_freq` into `new_freq`. Resamplers are cached, so their filter kernel is computed only once.
 
-def convert_mp3_to_ogg(in_path: str, out_path: str, *, quality: int = 0,
-                       sampling_rate: int = 22_050, volume: float = 2.3) -> None:
+    Args:
+        orig_freq: Input sample rate
+        new_freq: Output sample rate
+
+    Returns:
+        Resampler
+    """
+    return torchaudio.transforms.Resample(orig_freq=orig_freq, new_freq=new_freq)
+
+
+def convert_mp3_to_ogg(in_path: str, out_path: str, *, quality: int = 0,  # pylint: disable=too-many-arguments
+                       sampling_rate: int = 22_050, volume: float = 2.3, use_ffmpeg: bool = False) -> None:
     """Convert mp3 in `in_path` (e.g. produced by translation) into an OGG file in `out_path` matching Tiptoi's parameters (`quality, sampling_rate`).
 
     Args:
@@ -55,8 +219,19 @@ def convert_mp3_to_ogg(in_path: str, out_path: str, *, quality: int = 0,
         quality: Vorbis quality setting, the default value matches Tiptoi's files
         sampling_rate: The default value matches Tiptoi's files
         volume: Compensate seemingly quieter translated mp3 files with this factor, the default value seems to match Tiptoi files
+        use_ffmpeg: Convert with an ffmpeg subprocess instead of in-process (slower, but useful if libsndfile can't handle the input)
     """
-    cmd = ["ffmpeg", "-y", "-hide_banner", "-i", in_path, "-c:a", "libvorbis", "-q:a", str(quality),
-           "-ar", str(sampling_rate), "-filter:a", f"volume={volume}", out_path]
+    if use_ffmpeg:
+        cmd = ["ffmpeg", "-y", "-hide_banner", "-i", in_path, "-c:a", "libvorbis", "-q:a", str(quality),
+               "-ar", str(sampling_rate), "-filter:a", f"volume={volume}", out_path]
+
+        subprocess.check_call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        return
+
+    wav, sample_rate = torchaudio.load(in_path)
+    wav = get_resampler(sample_rate, sampling_rate)(wav)
+    wav = wav * volume
 
-    subprocess.check_call(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    # libsndfile maps compression level 0 - 1 into Vorbis quality 1 - 0, while ffmpeg's quality scale is 0 - 10
+    soundfile.write(out_path, wav.transpose(0, 1).numpy(), sampling_rate, format="OGG", subtype="VORBIS",
+                    compression_level=1 - quality / 10)
@@ -0,0 +1,55 @@
+"""Disk cache of extracted audio features, so that repeated runs over the same audio files skip decoding and feature extraction."""
+
+import os
+import hashlib
+import numpy as np
+import torch
+from typing import Any, Callable
+
+
+def get_cache_path(audio_path: str, cache_dir: str, config: dict[str, Any]) -> str:
+    """Get path of the cached features of the audio in `audio_path`.
+
+    Args:
+        audio_path: Path to the audio file
+        cache_dir: Directory with cached features
+        config: Settings of the feature extraction, features extracted with different settings are cached separately
+
+    Returns:
+        Path to the `.npy` file, keyed by the audio path, its modification time and `config`
+    """
+    key = repr((os.path.abspath(audio_path), os.stat(audio_path).st_mtime_ns, sorted(config.items())))
+
+    return os.path.join(cache_dir, f"{hashlib.sha1(key.encode()).hexdigest()}.npy")
+
+
+def load_or_compute_fbank(audio_path: str, compute_fbank: Callable[[str], torch.Tensor],
+                          cache_dir: str, config: dict[str, Any]) -> torch.Tensor:
+    """Load filterbank features of the audio in `audio_path` from `cache_dir`, or compute them with `compute_fbank` and cache them.
+
+    Args:
+        audio_path: Path to the audio file
+        compute_fbank: Function extracting features of an audio file, called on a cache miss
+        cache_dir: Directory with cached features, it's created when missing
+        config: Settings of the feature extraction done by `compute_fbank`
+
+    Returns:
+        Filterbank features
+    """
+    cache_path = get_cache_path(audio_path, cache_dir, config)
+
+    if os.path.exists(cache_path):
+        return torch.from_numpy(np.load(cache_path))
+
+    fbank = compute_fbank(audio_path)
+
+    # Written into a temporary file first, so that concurrent data loader workers never read a partially written file
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        np.save(f, fbank.numpy())
+
+    os.replace(tmp_path, cache_path)
+
+    return fbank
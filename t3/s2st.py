@@ -6,24 +6,35 @@ Inference is based on: https://github.com/facebookresearch/seamless_communicatio
 
 import os
 import torch
+import functools
 import logging
-import argparse
 import torchaudio
 from tqdm import tqdm
 from pathlib import Path
-from typing import NamedTuple
+from types import SimpleNamespace
+from typing import Callable, NamedTuple
+from dataclasses import asdict, dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from torch.utils.data import DataLoader
+from torch.nn.utils.rnn import pad_sequence
 from fairseq2.data import SequenceData
-from seamless_communication.inference import Translator
+from fairseq2.nn.projection import Linear
+from seamless_communication.inference import SequenceGeneratorOptions, Translator
 from fairseq2.data.audio import WaveformToFbankConverter
 from seamless_communication.store import add_gated_assets
 from seamless_communication.models.unity import load_gcmvn_stats, load_unity_unit_tokenizer
-from seamless_communication.cli.m4t.predict import set_generation_opts, add_inference_arguments
+from seamless_communication.cli.m4t.predict import set_generation_opts
 from seamless_communication.cli.expressivity.predict.pretssel_generator import PretsselGenerator
 from seamless_communication.cli.expressivity.predict.predict import remove_prosody_tokens_from_text
 
+from . import audio_utils, cache
+
 
 log = logging.getLogger(__name__)
 
+FBANK_CONFIG = {"num_mel_bins": 80, "waveform_scale": 2**15, "channel_last": True, "standardize": False}  # Settings of the filterbank converter
+SynthesizedBatch = tuple[list[tuple[torch.Tensor, torch.cuda.Event | None]], int]  # Audio in host memory (with copy events) and its sample rate
+
 
 class TranslatedAudio(NamedTuple):
     """Hold results of a translated audio. This is intended to hold data returned by `translate_audio_files()`."""
@@ -31,39 +42,380 @@ class TranslatedAudio(NamedTuple):
     text: str
 
 
-def translate_audio_files(input_paths: list[str],  # pylint: disable=too-many-arguments, too-many-locals
-                          output_directory: str,
-                          *,
-                          target_language: str = "eng",
-                          model_name: str = "seamless_expressivity",
-                          vocoder_name: str = "vocoder_pretssel",
-                          duration_factor: float = 1.0,
-                          force_cpu: bool = False) -> list[TranslatedAudio]:
-    """Translate audio files specified in `input_paths`, saving them (along with transcripts) into the `output_directory`.
+class Pipeline(NamedTuple):
+    """Hold models and constants needed for the inference. This is intended to hold data returned by `load_pipeline()`."""
+    translator: Translator
+    pretssel_generator: PretsselGenerator
+    fbank_extractor: WaveformToFbankConverter
+    gcmvn_scale: torch.Tensor  # Inverse of the global standard deviation
+    gcmvn_bias: torch.Tensor  # Negative global mean multiplied by the scale
+
+
+class CudaStreams(NamedTuple):
+    """Hold CUDA streams of the batched inference, so that the vocoder and copies into host memory overlap with the translator."""
+    translator: torch.cuda.Stream
+    vocoder: torch.cuda.Stream
+    copy: torch.cuda.Stream
+
+
+@dataclass(frozen=True)
+class InferenceConfig:  # pylint: disable=too-many-instance-attributes
+    """Hold generation settings of the translation, the defaults match seamless_communication's inference CLI (`add_inference_arguments()`)."""
+    text_generation_beam_size: int = 5
+    text_generation_max_len_a: int = 1
+    text_generation_max_len_b: int = 200
+    text_generation_ngram_blocking: bool = False
+    text_unk_blocking: bool = False
+    no_repeat_ngram_size: int = 4
+    unit_generation_beam_size: int = 5
+    unit_generation_max_len_a: int = 25
+    unit_generation_max_len_b: int = 50
+    unit_generation_ngram_blocking: bool = False
+    unit_generation_ngram_filtering: bool = False
+
+
+@functools.cache
+def get_generation_opts(config: InferenceConfig) -> tuple[SequenceGeneratorOptions, SequenceGeneratorOptions]:
+    """Get text and unit generation options based on `config`. Options are built only once for each config.
 
     Args:
-        input_paths: Files to be translated
-        output_directory: Destination of translated audio, audio files will be in mp3 format
-        force_cpu: Force CPU inference even if a GPU is available (but when it doesn't have enough memory)
+        config: Generation settings
 
     Returns:
-        Tuple of the output path and transcript
+        Text generation options and unit generation options
     """
-    # Inference setup
+    return set_generation_opts(SimpleNamespace(**asdict(config)))
+
+
+def make_batches(durations: list[float], batch_size: int, max_batch_duration: float) -> list[list[int]]:
+    """Group audio files into batches based on their `durations`, so that each batch holds files of a similar length, which minimizes padding.
+
+    Longest batches go first, so that running out of memory shows up early and later batches reuse the cached memory.
+
+    Args:
+        durations: Durations of audio files
+        batch_size: Maximum number of files in a batch
+        max_batch_duration: Maximum duration of a batch including padding (number of files * the longest duration), a batch always holds at least one file
+
+    Returns:
+        Batches of indices into `durations`
+    """
+    order = sorted(range(len(durations)), key=lambda i: durations[i], reverse=True)
+    batches: list[list[int]] = []
+
+    for i in order:
+        # Files are sorted, so the first file is the longest one in each batch
+        if batches and len(batches[-1]) < batch_size and (len(batches[-1]) + 1) * durations[batches[-1][0]] <= max_batch_duration:
+            batches[-1].append(i)
+        else:
+            batches.append([i])
+
+    return batches
+
+
+def pad_batch(seqs: list[torch.Tensor], bucketed: bool = False) -> torch.Tensor:
+    """Pad sequences in `seqs` (of shape `(length, features)`) into a single batch tensor of shape `(batch, length, features)`.
+
+    Args:
+        seqs: Sequences to be padded
+        bucketed: Pad the length up to the nearest power of two, so that only a few distinct input shapes
+            reach the models (which lets compiled models reuse their CUDA graphs)
+
+    Returns:
+        Zero-padded batch of sequences
+    """
+    batch = pad_sequence(seqs, batch_first=True)
+
+    if bucketed:
+        length = batch.shape[1]
+        bucket_length = 1 << max(length - 1, 0).bit_length()
+        batch = torch.nn.functional.pad(batch, (0, 0, 0, bucket_length - length))
+
+    return batch
+
+
+def quantize_int8(module: torch.nn.Module) -> None:
+    """Quantize weights of linear layers in `module` into INT8 in-place, activations are quantized dynamically during the inference (CPU only).
+
+    fairseq2's `Linear` projections don't derive from `torch.nn.Linear`, so they are swapped for equivalent
+    `torch.nn.Linear` layers (sharing the parameters) first, otherwise `quantize_dynamic()` would skip them.
+
+    Args:
+        module: Module to be quantized, e.g. `Translator.model`
+    """
+    for parent in list(module.modules()):
+        for name, child in parent.named_children():
+            if isinstance(child, Linear):
+                linear = torch.nn.Linear(child.input_dim, child.output_dim, bias=child.bias is not None, device="meta")
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(parent, name, linear)
+
+    torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def extract_fbank(audio_path: str, fbank_extractor: WaveformToFbankConverter) -> torch.Tensor:
+    """Load audio in `audio_path`, resample it to 16 kHz and extract its mel filterbank features.
+
+    Args:
+        audio_path: Path to the audio file
+        fbank_extractor: Filterbank converter, expecting channel-last waveforms
+
+    Returns:
+        Filterbank features of shape `(frames, mel_bins)`
+    """
+    # libsndfile is faster to decode OGG than the default backends, it decodes into the channel-last layout directly
+    wav, sample_rate = torchaudio.load(audio_path, channels_first=False, backend="soundfile")
+
+    # Resampling works on the channel-first layout, 16 kHz audio skips it and stays in the decoded layout
+    if sample_rate != 16_000:
+        wav = audio_utils.get_resampler(sample_rate)(wav.T).T
+
+    return fbank_extractor({"waveform": wav, "sample_rate": 16_000})["fbank"]
+
+
+class FbankDataset(torch.utils.data.Dataset):
+    """Load audio files and extract their normalized filterbank features, intended to be used with a `DataLoader` so that this happens in background workers."""
+
+    def __init__(self, audio_paths: list[str], fbank_extractor: WaveformToFbankConverter,  # pylint: disable=too-many-arguments
+                 gcmvn_scale: torch.Tensor, gcmvn_bias: torch.Tensor, *, dtype: torch.dtype, cache_dir: str | None = None) -> None:
+        """Initialize the dataset.
+
+        Args:
+            audio_paths: Paths to the audio files
+            fbank_extractor: Filterbank converter (running on CPU), expecting channel-last waveforms
+            gcmvn_scale: Scale of the global normalization (inverse of the standard deviation)
+            gcmvn_bias: Bias of the global normalization
+            dtype: Data type of the returned features
+            cache_dir: Directory caching raw features across runs, `None` disables the cache
+        """
+        self.audio_paths = audio_paths
+        self.fbank_extractor = fbank_extractor
+        self.gcmvn_scale = gcmvn_scale
+        self.gcmvn_bias = gcmvn_bias
+        self.dtype = dtype
+        self.cache_dir = cache_dir
+
+    def __len__(self) -> int:
+        """Get number of audio files."""
+        return len(self.audio_paths)
+
+    def __getitem__(self, index: int) -> tuple[int, torch.Tensor, torch.Tensor]:
+        """Get features of the audio file at `index`.
+
+        Args:
+            index: Index of the audio file in `audio_paths`
+
+        Returns:
+            `index, fbank, gcmvn_fbank` - the index, utterance-normalized and globally-normalized features
+        """
+        audio_path = self.audio_paths[index]
+
+        if self.cache_dir is None:
+            fbank = extract_fbank(audio_path, self.fbank_extractor)
+        else:
+            fbank = cache.load_or_compute_fbank(audio_path, lambda p: extract_fbank(p, self.fbank_extractor), self.cache_dir, FBANK_CONFIG)
+
+        gcmvn_fbank = torch.addcmul(self.gcmvn_bias, fbank, self.gcmvn_scale).to(self.dtype)
+        # Utterance statistics in a single pass over the fbank, the normalization is a second (in-place) pass
+        var, mean = torch.var_mean(fbank, dim=0)
+        scale = var.rsqrt()
+        fbank = torch.addcmul(-mean * scale, fbank, scale, out=fbank).to(self.dtype)  # In-place, the raw fbank isn't needed anymore
+
+        return index, fbank, gcmvn_fbank
+
+
+def collate_fbanks(items: list[tuple[int, torch.Tensor, torch.Tensor]],
+                   bucketed: bool = False) -> tuple[list[int], torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Collate items returned by `FbankDataset` into a padded batch.
+
+    Args:
+        items: Items to be collated
+        bucketed: Pad the length up to the nearest power of two, see `pad_batch()`
+
+    Returns:
+        `indices, fbanks, gcmvn_fbanks, seq_lens` - indices of the audio files, padded batches of both features and their lengths
+    """
+    indices = [item[0] for item in items]
+    fbanks = pad_batch([item[1] for item in items], bucketed)
+    gcmvn_fbanks = pad_batch([item[2] for item in items], bucketed)
+    seq_lens = torch.tensor([item[1].shape[0] for item in items], dtype=torch.long)
+
+    return indices, fbanks, gcmvn_fbanks, seq_lens
+
+
+def copy_to_host(tensor: torch.Tensor, stream: torch.cuda.Stream | None) -> tuple[torch.Tensor, torch.cuda.Event | None]:
+    """Copy `tensor` into host memory, asynchronously on the CUDA `stream` if it's provided.
+
+    Args:
+        tensor: Tensor to be copied
+        stream: Side CUDA stream for the copy, `None` for a blocking copy
+
+    Returns:
+        Tensor in (pinned) host memory and an event which signals the end of the copy (`None` when the copy was blocking)
+    """
+    if stream is None:
+        return tensor.cpu(), None
+
+    stream.wait_stream(torch.cuda.current_stream(tensor.device))
+
+    with torch.cuda.stream(stream):
+        host_tensor = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+        host_tensor.copy_(tensor, non_blocking=True)
+        tensor.record_stream(stream)  # Keep the caching allocator from reusing the memory before the copy ends
+        copied = stream.record_event()
+
+    return host_tensor, copied
+
+
+def save_translation(wav: torch.Tensor, sample_rate: int, text: str, *,  # pylint: disable=too-many-arguments
+                     output_path: str, text_path: str, copied: torch.cuda.Event | None = None) -> None:
+    """Save translated audio `wav` into `output_path` and its transcript `text` into `text_path`.
+
+    Args:
+        wav: Translated audio in host memory, as 16-bit PCM
+        sample_rate: Sample rate of `wav`
+        text: Transcript of the translated audio
+        output_path: Destination of the audio file, the format is deduced from the extension
+        text_path: Destination of the transcript
+        copied: Event to wait for before reading `wav`, when it's being copied from GPU asynchronously
+    """
+    if copied is not None:
+        copied.synchronize()
+
+    torchaudio.save(output_path, wav, sample_rate=sample_rate)
+
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def translate_batch(translator: Translator, src: SequenceData, prosody_encoder_input: SequenceData, *,  # pylint: disable=too-many-arguments
+                    target_language: str, config: InferenceConfig, duration_factor: float) -> tuple[list[str], list[list[int]]]:
+    """Translate a batch of speech features `src` into text and units.
+
+    Args:
+        translator: Translation model
+        src: Utterance-normalized features of the source audio
+        prosody_encoder_input: Globally-normalized features of the source audio
+        target_language: Target language of the translation
+        config: Text and unit generation settings
+        duration_factor: Duration factor of the predicted units
+
+    Returns:
+        Transcripts of the translations and their units
+    """
+    text_generation_opts, unit_generation_opts = get_generation_opts(config)
+
+    with torch.inference_mode():
+        text_output, unit_output = translator.predict(
+            src,
+            "s2st",
+            target_language,
+            text_generation_opts=text_generation_opts,
+            unit_generation_opts=unit_generation_opts,
+            unit_generation_ngram_filtering=config.unit_generation_ngram_filtering,
+            duration_factor=duration_factor,
+            prosody_encoder_input=prosody_encoder_input,
+        )
+
+    assert unit_output is not None
+
+    return [remove_prosody_tokens_from_text(str(text)) for text in text_output], unit_output.units
+
+
+def synthesize(pretssel_generator: PretsselGenerator, units: list[list[int]], prosody_encoder_input: SequenceData, *,  # pylint: disable=too-many-arguments
+               target_language: str, streams: CudaStreams | None = None, translated: torch.cuda.Event | None = None) -> SynthesizedBatch:
+    """Run the vocoder on `units` and copy the resulting audio into host memory.
+
+    Args:
+        pretssel_generator: Vocoder
+        units: Units predicted by the translator
+        prosody_encoder_input: Globally-normalized features of the source audio
+        target_language: Target language of the translation
+        streams: CUDA streams to run the vocoder and copies on, `None` runs everything on the current stream (e.g. on CPU)
+        translated: Event which signals the end of the translator's work on its stream, the vocoder waits for it
+
+    Returns:
+        Audio in host memory (with copy events) and its sample rate
+    """
+    vocoder_stream = streams.vocoder if streams is not None else None
+
+    if vocoder_stream is not None and translated is not None:
+        vocoder_stream.wait_event(translated)
+
+    # Inference mode is thread-local, so it's enabled here, in the thread running the vocoder
+    with torch.cuda.stream(vocoder_stream), torch.inference_mode():
+        speech_output = pretssel_generator.predict(
+            units,
+            tgt_lang=target_language,
+            prosody_encoder_input=prosody_encoder_input,
+        )
+
+        # Audio is quantized to 16-bit PCM on the device, which halves the transfer to host memory (scaling is done in FP32, FP16 would round 32767 up and overflow)
+        copy_stream = streams.copy if streams is not None else None
+        wavs = [copy_to_host(wav[0].to(torch.float32).clamp(-1, 1).mul(32767).to(torch.int16), copy_stream) for wav in speech_output.audio_wavs]
+
+    # Inputs come from the translator's stream, keep them alive until the vocoder is done with them
+    if vocoder_stream is not None:
+        vocoder_stream.synchronize()
+
+    return wavs, speech_output.sample_rate
+
+
+def save_batch(input_paths: list[str], texts: list[str], synthesized: SynthesizedBatch,  # pylint: disable=too-many-locals
+               output_directory: str, executor: ThreadPoolExecutor) -> tuple[list[Future[None]], list[TranslatedAudio]]:
+    """Save synthesized audio of a batch (translated from `input_paths`) along with transcripts `texts` into the `output_directory`, in background threads.
+
+    Args:
+        input_paths: Translated files of the batch
+        texts: Transcripts of the translations
+        synthesized: Synthesized audio of the batch and its sample rate
+        output_directory: Destination of translated audio
+        executor: Thread pool doing the saving
+
+    Returns:
+        Futures of the saving (to propagate errors) and results of the batch
+    """
+    wavs, sample_rate = synthesized
+    futures = []
+    results = []
+
+    for input_path, text, (wav, copied) in zip(input_paths, texts, wavs):
+        # File name
+        file_name = os.path.basename(input_path)
+        file_name_base, _ = os.path.splitext(file_name)
+        output_path = os.path.join(output_directory, f"{file_name_base}.mp3")
+        text_path = os.path.join(output_directory, f"{file_name_base}.txt")
+
+        futures.append(executor.submit(save_translation, wav, sample_rate, text, output_path=output_path, text_path=text_path, copied=copied))
+        results.append(TranslatedAudio(output_path, text))
+
+    return futures, results
+
+
+@functools.cache
+def add_seamless_expressive_assets() -> None:
+    """Register gated SeamlessExpressive model cards (models are expected in the `SeamlessExpressive` folder), only once."""
     add_gated_assets(Path("SeamlessExpressive"))
 
-    if torch.cuda.is_available():
-        device = torch.device("cuda:0")
-        dtype = torch.float16
-    else:
-        device = torch.device("cpu")
-        dtype = torch.float32
 
-    if force_cpu:  # For tests
-        device = torch.device("cpu")
-        dtype = torch.float32
+@functools.cache
+def load_pipeline(model_name: str, vocoder_name: str, device: torch.device, precision: str, compile_model: bool) -> Pipeline:
+    """Load models needed for the inference. Loaded models are kept in memory, so repeated calls with the same arguments reuse them.
 
-    log.info(f"Using {device.type.upper()} for inference")
+    Args:
+        model_name: Name of the translation model
+        vocoder_name: Name of the vocoder model
+        device: Inference device
+        precision: Inference precision - `fp32`, `fp16` or `int8`
+        compile_model: Compile the speech encoder (with CUDA graphs) and the vocoder with `torch.compile`
+
+    Returns:
+        Models and constants needed for the inference
+    """
+    add_seamless_expressive_assets()
+
+    dtype = torch.float16 if precision == "fp16" else torch.float32
 
     unit_tokenizer = load_unity_unit_tokenizer(model_name)
 
@@ -73,6 +425,14 @@ def translate_audio_files(input_paths: list[str],  # pylint: disable=too-many-ar
         device=device,
         dtype=dtype
     )
+    translator.model.eval()
+
+    if precision == "int8":
+        quantize_int8(translator.model)
+
+    if compile_model:
+        log.info("Compiling the speech encoder")
+        translator.model.speech_encoder = torch.compile(translator.model.speech_encoder, mode="reduce-overhead")
 
     pretssel_generator = PretsselGenerator(
         vocoder_name,
@@ -80,98 +440,153 @@ def translate_audio_files(input_paths: list[str],  # pylint: disable=too-many-ar
         device=device,
         dtype=dtype
     )
+    pretssel_generator.pretssel_model.eval()
 
-    fbank_extractor = WaveformToFbankConverter(
-        num_mel_bins=80,
-        waveform_scale=2**15,
-        channel_last=True,
-        standardize=False,
-        device=device,
-        dtype=dtype
-    )
+    if precision == "int8":
+        quantize_int8(pretssel_generator.pretssel_model)
+
+    # Vocoder inputs (units) vary in length even within a bucket, so it's compiled for dynamic shapes and without CUDA graphs
+    if compile_model:
+        log.info("Compiling the vocoder")
+        pretssel_generator.pretssel_model = torch.compile(pretssel_generator.pretssel_model, dynamic=True)
+
+    # Features are extracted on CPU (in data loader workers) and kept in FP32 for the normalization,
+    # they are cast into the model's precision afterwards
+    fbank_extractor = WaveformToFbankConverter(**FBANK_CONFIG, device=torch.device("cpu"), dtype=torch.float32)
 
-    _gcmvn_mean, _gcmvn_std = load_gcmvn_stats(vocoder_name)
-    gcmvn_mean = torch.tensor(_gcmvn_mean, device=device, dtype=dtype)
-    gcmvn_std = torch.tensor(_gcmvn_std, device=device, dtype=dtype)
+    # Normalizations are done as a single multiply-add (one pass over the fbank) with a precomputed scale and bias
+    gcmvn_mean, gcmvn_std = load_gcmvn_stats(vocoder_name)
+    gcmvn_scale = torch.tensor(gcmvn_std, dtype=torch.float32).reciprocal()
+    gcmvn_bias = -torch.tensor(gcmvn_mean, dtype=torch.float32) * gcmvn_scale
 
-    # Args hacking
-    parser = argparse.ArgumentParser(description="Running SeamlessExpressive inference.")
-    parser = add_inference_arguments(parser)
-    args = parser.parse_args([])
-    text_generation_opts, unit_generation_opts = set_generation_opts(args)
+    return Pipeline(translator, pretssel_generator, fbank_extractor, gcmvn_scale, gcmvn_bias)
+
+
+def translate_audio_files(input_paths: list[str],  # pylint: disable=too-many-arguments, too-many-locals
+                          output_directory: str,
+                          *,
+                          target_language: str = "eng",
+                          model_name: str = "seamless_expressivity",
+                          vocoder_name: str = "vocoder_pretssel",
+                          duration_factor: float = 1.0,
+                          config: InferenceConfig = InferenceConfig(),
+                          batch_size: int = 4,
+                          max_batch_duration: float = 120.0,
+                          num_workers: int | None = None,
+                          fbank_cache_dir: str | None = None,
+                          compile_model: bool = False,
+                          precision: str | None = None,
+                          force_cpu: bool = False) -> list[TranslatedAudio]:
+    """Translate audio files specified in `input_paths`, saving them (along with transcripts) into the `output_directory`.
+
+    Args:
+        input_paths: Files to be translated
+        output_directory: Destination of translated audio, audio files will be in mp3 format
+        config: Text and unit generation settings
+        batch_size: Number of audio files translated at once, higher values are faster but need more (GPU) memory
+        max_batch_duration: Maximum duration of audio (in seconds, including padding) translated at once, long files are translated in smaller batches
+        num_workers: Number of background processes loading audio files and extracting their features, they are started on each call
+            (forked from the process holding the models) and resamplers are cached within them only for that call.
+            Defaults to 2, or to 0 (loading in the main process) when all files fit into a single batch, as there is nothing to prefetch
+        fbank_cache_dir: Directory caching extracted features, so that repeated runs over the same files skip audio decoding and feature extraction
+        compile_model: Compile the speech encoder (with CUDA graphs) and the vocoder with `torch.compile`, this is slow to warm up but pays off on many files, GPU only
+        precision: Inference precision - `fp32`, `fp16` (GPU only) or `int8` (CPU only, quantizes both the translator and the vocoder), defaults to `fp16` on GPU and `fp32` on CPU
+        force_cpu: Force CPU inference even if a GPU is available (but when it doesn't have enough memory)
+
+    Returns:
+        Tuple of the output path and transcript
+    """
+    # Inference setup
+    if torch.cuda.is_available() and not force_cpu:  # CPU is forced in tests
+        device = torch.device("cuda:0")
+    else:
+        device = torch.device("cpu")
+
+    if precision is None:
+        precision = "fp16" if device.type == "cuda" else "fp32"
+    elif precision == "fp16" and device.type == "cpu":
+        log.warning("FP16 inference is not supported on CPU, using FP32 instead")
+        precision = "fp32"
+    elif precision == "int8" and device.type == "cuda":
+        log.warning("INT8 inference is not supported on GPU, using FP16 instead")
+        precision = "fp16"
+
+    log.info(f"Using {device.type.upper()} for inference in {precision.upper()} precision")
+
+    dtype = torch.float16 if precision == "fp16" else torch.float32
+
+    # Inputs are padded into power-of-two length buckets, so CUDA graphs are captured only for a few shapes
+    bucketed = compile_model and device.type == "cuda"
+
+    translator, pretssel_generator, fbank_extractor, gcmvn_scale, gcmvn_bias = load_pipeline(model_name, vocoder_name, device, precision, bucketed)
 
     # Output directory
     os.makedirs(output_directory, exist_ok=True)
 
-    # List which will be returned
-    out = []
+    durations = [audio_utils.get_duration(p) for p in input_paths]  # Cached from the length checks
+    batches = make_batches(durations, batch_size, max_batch_duration)
 
-    # Per-audio file inference
-    for path in tqdm(input_paths, unit="translation", leave=False):
-        wav, sample_rate = torchaudio.load(path)
-        wav = torchaudio.functional.resample(wav, orig_freq=sample_rate, new_freq=16_000)
-        wav = wav.transpose(0, 1)
+    # Sequence lengths are written into a preallocated buffer on the inference device, its address stays static (needed by CUDA graphs)
+    seq_lens_buffer = torch.empty(batch_size, dtype=torch.long, device=device)
 
-        data = fbank_extractor(
-            {
-                "waveform": wav,
-                "sample_rate": 16_000,
-            }
-        )
+    # Results keyed by the index in `input_paths`, so that the input order can be restored
+    results: dict[int, TranslatedAudio] = {}
+    futures: list[Future[None]] = []
 
-        fbank = data["fbank"]
-        gcmvn_fbank = fbank.subtract(gcmvn_mean).divide(gcmvn_std)
-        std, mean = torch.std_mean(fbank, dim=0)
-        fbank = fbank.subtract(mean).divide(std)
+    # On GPU, translator and vocoder run on separate CUDA streams, the vocoder in a background thread,
+    # so that the vocoder of one batch overlaps with the translator of the next batch.
+    # Translated audio is copied from GPU on a side stream and encoded in background threads, overlapping with the next batch
+    streams = CudaStreams(torch.cuda.Stream(device), torch.cuda.Stream(device), torch.cuda.Stream(device)) if device.type == "cuda" else None
 
-        src = SequenceData(
-            seqs=fbank.unsqueeze(0),
-            seq_lens=torch.LongTensor([fbank.shape[0]]),
-            is_ragged=False,
-        )
-        src_gcmvn = SequenceData(
-            seqs=gcmvn_fbank.unsqueeze(0),
-            seq_lens=torch.LongTensor([gcmvn_fbank.shape[0]]),
-            is_ragged=False,
-        )
+    # Audio files are loaded and their features extracted in background workers, while the previous batch is being translated
+    if num_workers is None:
+        num_workers = 2 if len(batches) > 1 else 0
 
-        text_output, unit_output = translator.predict(
-            src,
-            "s2st",
-            target_language,
-            text_generation_opts=text_generation_opts,
-            unit_generation_opts=unit_generation_opts,
-            unit_generation_ngram_filtering=args.unit_generation_ngram_filtering,
-            duration_factor=duration_factor,
-            prosody_encoder_input=src_gcmvn,
-        )
+    dataset = FbankDataset(input_paths, fbank_extractor, gcmvn_scale, gcmvn_bias, dtype=dtype, cache_dir=fbank_cache_dir)
+    loader = DataLoader(dataset, batch_sampler=batches, num_workers=num_workers,
+                        collate_fn=functools.partial(collate_fbanks, bucketed=bucketed), pin_memory=device.type == "cuda")
 
-        assert unit_output is not None
-        speech_output = pretssel_generator.predict(
-            unit_output.units,
-            tgt_lang=target_language,
-            prosody_encoder_input=src_gcmvn,
-        )
+    # Batched inference
+    with (tqdm(total=len(input_paths), unit="translation", leave=False) as progress,
+          ThreadPoolExecutor(max_workers=1) as vocoder_executor,
+          ThreadPoolExecutor(max_workers=2) as executor):
+        pending: list[tuple[list[int], list[str], Callable[[], SynthesizedBatch]]] = []  # Batches waiting for their vocoder
 
-        # File name
-        file_name = os.path.basename(path)
-        file_name_base, _ = os.path.splitext(file_name)
-        output_path = os.path.join(output_directory, f"{file_name_base}.mp3")
-        text_path = os.path.join(output_directory, f"{file_name_base}.txt")
+        for batch_number, (batch_indices, fbanks, gcmvn_fbanks, lengths) in enumerate(loader, start=1):
+            with torch.cuda.stream(streams.translator if streams is not None else None):
+                # Both inputs share the same lengths, padding is masked out by the models
+                seq_lens = seq_lens_buffer[:len(batch_indices)]
+                seq_lens.copy_(lengths, non_blocking=True)
 
-        # Save audio file
-        torchaudio.save(
-            output_path,
-            speech_output.audio_wavs[0][0].to(torch.float32).cpu(),
-            sample_rate=speech_output.sample_rate,
-        )
+                src = SequenceData(seqs=fbanks.to(device, non_blocking=True), seq_lens=seq_lens, is_ragged=True)
+                src_gcmvn = SequenceData(seqs=gcmvn_fbanks.to(device, non_blocking=True), seq_lens=seq_lens, is_ragged=True)
+
+                texts, units = translate_batch(translator, src, src_gcmvn, target_language=target_language, config=config, duration_factor=duration_factor)
+
+                # The lengths buffer gets overwritten by the next batch while the vocoder might still be running
+                vocoder_input = SequenceData(seqs=src_gcmvn["seqs"], seq_lens=seq_lens.clone(), is_ragged=True)
+                translated = streams.translator.record_event() if streams is not None else None
+
+            synthesis = functools.partial(synthesize, pretssel_generator, units, vocoder_input,
+                                          target_language=target_language, streams=streams, translated=translated)
+
+            # On CPU, the vocoder runs inline when the batch gets saved (right away), in a background thread
+            # it would compete with the translator of the next batch for the same cores
+            pending.append((batch_indices, texts, vocoder_executor.submit(synthesis).result if streams is not None else synthesis))
 
-        # Save transcript
-        text = remove_prosody_tokens_from_text(str(text_output[0]))
+            # On GPU, the previous batch is saved once its vocoder is done, while the vocoder of this batch is running,
+            # all batches are saved after the last one
+            num_running = 1 if streams is not None and batch_number < len(batches) else 0
 
-        with open(text_path, "w", encoding="utf-8") as f:
-            f.write(text)
+            while len(pending) > num_running:
+                done_indices, done_texts, synthesized = pending.pop(0)
+                batch_futures, batch_results = save_batch([input_paths[i] for i in done_indices], done_texts, synthesized(), output_directory, executor)
+                futures.extend(batch_futures)
+                results.update(zip(done_indices, batch_results))
+                progress.update(len(done_indices))
 
-        out.append(TranslatedAudio(output_path, text))
+        # Propagate errors from the saving threads
+        for future in futures:
+            future.result()
 
-    return out
+    return [results[i] for i in range(len(input_paths))]
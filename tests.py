@@ -1,7 +1,12 @@
 import os
+import torch
+import tempfile
+import soundfile
 import unittest
 
-from t3 import audio_utils, s2st
+from fairseq2.nn.projection import Linear
+
+from t3 import audio_utils, cache, s2st
 
 
 PURE_VOICE = [4, 6, 7, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19]  # Voice without any background sounds
@@ -10,26 +15,76 @@ VOICE_BG_SOUNDS = [5, 39, 54, 139, 186]  # Voice with background sounds
 SONGS = [0, 1, 2, 83, 206]
 
 
+def ogg_paths(ids: list[int]) -> list[str]:
+    return [f"ogg/Mein Woerter-Bilderbuch Unser Zuhause_{id}.ogg" for id in ids]
+
+
 class VAD(unittest.TestCase):
     def test_pure_voice(self):
-        for id in PURE_VOICE:
+        for id, has_voice in zip(PURE_VOICE, audio_utils.detect_speech_batch(ogg_paths(PURE_VOICE))):
             with self.subTest(id):
-                self.assertTrue(audio_utils.detect_speech(f"ogg/Mein Woerter-Bilderbuch Unser Zuhause_{id}.ogg"))
+                self.assertTrue(has_voice)
 
     def test_no_voice(self):
-        for id in NO_VOICE:
+        for id, has_voice in zip(NO_VOICE, audio_utils.detect_speech_batch(ogg_paths(NO_VOICE))):
             with self.subTest(id):
-                self.assertFalse(audio_utils.detect_speech(f"ogg/Mein Woerter-Bilderbuch Unser Zuhause_{id}.ogg"))
+                self.assertFalse(has_voice)
 
     def test_voice_bg_sounds(self):
-        for id in VOICE_BG_SOUNDS:
+        for id, has_voice in zip(VOICE_BG_SOUNDS, audio_utils.detect_speech_batch(ogg_paths(VOICE_BG_SOUNDS))):
             with self.subTest(id):
-                self.assertTrue(audio_utils.detect_speech(f"ogg/Mein Woerter-Bilderbuch Unser Zuhause_{id}.ogg"))
+                self.assertTrue(has_voice)
 
     def test_songs(self):
-        for id in SONGS:
+        for id, has_voice in zip(SONGS, audio_utils.detect_speech_batch(ogg_paths(SONGS))):
+            with self.subTest(id):
+                self.assertTrue(has_voice)
+
+    def test_single(self):
+        for id, has_voice in [(PURE_VOICE[0], True), (NO_VOICE[0], False), (VOICE_BG_SOUNDS[0], True), (SONGS[0], True)]:
             with self.subTest(id):
-                self.assertTrue(audio_utils.detect_speech(f"ogg/Mein Woerter-Bilderbuch Unser Zuhause_{id}.ogg"))
+                self.assertEqual(audio_utils.detect_speech(ogg_paths([id])[0]), has_voice)
+
+    def test_batch_parity(self):
+        paths = ogg_paths(PURE_VOICE + NO_VOICE + VOICE_BG_SOUNDS + SONGS)
+
+        # Both functions share the cache, it's cleared so that each of them runs the VAD model
+        audio_utils.SPEECH_CACHE.clear()
+        has_voice_batch = audio_utils.detect_speech_batch(paths, batch_size=8)
+        audio_utils.SPEECH_CACHE.clear()
+        has_voice = [audio_utils.detect_speech(p) for p in paths]
+
+        self.assertEqual(has_voice_batch, has_voice)
+
+    def test_short(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "short.wav")
+            soundfile.write(path, torch.rand(160).sub(0.5).numpy(), 16_000)  # 10 ms, shorter than a single VAD chunk
+
+            audio_utils.SPEECH_CACHE.clear()
+            has_voice_batch = audio_utils.detect_speech_batch([path])
+            audio_utils.SPEECH_CACHE.clear()
+            has_voice = audio_utils.detect_speech(path)
+            audio_utils.SPEECH_CACHE.clear()
+
+        self.assertEqual(has_voice_batch, [has_voice])
+
+    def test_cache(self):
+        path = ogg_paths([PURE_VOICE[0]])[0]
+        audio_utils.SPEECH_CACHE.clear()
+        audio_utils.detect_speech_batch([path])
+        self.assertEqual(list(audio_utils.SPEECH_CACHE), [(path, os.stat(path).st_mtime_ns, 0.8)])
+
+        # Cached results are returned without running the VAD model
+        audio_utils.SPEECH_CACHE[(path, os.stat(path).st_mtime_ns, 0.8)] = False
+        self.assertEqual(audio_utils.detect_speech_batch([path]), [False])
+        self.assertFalse(audio_utils.detect_speech(path))
+        audio_utils.SPEECH_CACHE.clear()
+
+    def test_batch(self):
+        ids = PURE_VOICE + NO_VOICE + VOICE_BG_SOUNDS
+        has_voice = audio_utils.detect_speech_batch(ogg_paths(ids), batch_size=8)
+        self.assertEqual(has_voice, [True] * len(PURE_VOICE) + [False] * len(NO_VOICE) + [True] * len(VOICE_BG_SOUNDS))
 
 
 class Various(unittest.TestCase):
@@ -39,6 +94,71 @@ class Various(unittest.TestCase):
     def test_too_long_2(self):
         self.assertTrue(audio_utils.check_audio_length("ogg/Mein Woerter-Bilderbuch Unser Zuhause_4.ogg"))
 
+    def test_convert_to_ogg(self):
+        in_path = "ogg/Mein Woerter-Bilderbuch Unser Zuhause_4.ogg"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = os.path.join(tmp_dir, "converted.ogg")
+            audio_utils.convert_mp3_to_ogg(in_path, out_path)
+            info = soundfile.info(out_path)
+
+        self.assertEqual(info.samplerate, 22_050)
+        self.assertEqual(info.channels, soundfile.info(in_path).channels)
+        self.assertEqual(info.subtype, "VORBIS")
+
+
+class Cache(unittest.TestCase):
+    def test_fbank_cache(self):
+        computed = []
+
+        def compute_fbank(path):
+            computed.append(path)
+            return torch.rand(10, 80)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            audio_path = os.path.join(tmp_dir, "audio.ogg")
+            cache_dir = os.path.join(tmp_dir, "cache")
+
+            with open(audio_path, "wb") as f:
+                f.write(b"audio")
+
+            # Miss
+            fbank = cache.load_or_compute_fbank(audio_path, compute_fbank, cache_dir, s2st.FBANK_CONFIG)
+            self.assertEqual(len(computed), 1)
+
+            # Hit
+            cached_fbank = cache.load_or_compute_fbank(audio_path, compute_fbank, cache_dir, s2st.FBANK_CONFIG)
+            self.assertEqual(len(computed), 1)
+            self.assertTrue(torch.equal(fbank, cached_fbank))
+
+            # Different extractor settings
+            cache.load_or_compute_fbank(audio_path, compute_fbank, cache_dir, {**s2st.FBANK_CONFIG, "num_mel_bins": 40})
+            self.assertEqual(len(computed), 2)
+
+            # Modified file
+            mtime_ns = os.stat(audio_path).st_mtime_ns
+            os.utime(audio_path, ns=(mtime_ns + 1_000_000_000, mtime_ns + 1_000_000_000))
+            cache.load_or_compute_fbank(audio_path, compute_fbank, cache_dir, s2st.FBANK_CONFIG)
+            self.assertEqual(len(computed), 3)
+
+
+class Quantization(unittest.TestCase):
+    def test_quantize_int8(self):
+        torch.manual_seed(0)
+        module = torch.nn.Sequential(Linear(64, 128, bias=True), torch.nn.ReLU(), Linear(128, 32, bias=False))
+        x = torch.randn(16, 64)
+
+        with torch.inference_mode():
+            expected = module(x)
+            s2st.quantize_int8(module)
+            out = module(x)
+
+        for i in [0, 2]:
+            with self.subTest(i):
+                self.assertIsInstance(module[i], torch.ao.nn.quantized.dynamic.Linear)
+
+        self.assertLess(((out - expected).norm() / expected.norm()).item(), 0.05)  # Relative error
+
 
 class S2ST(unittest.TestCase):
     def test_inference(self):
@@ -60,6 +180,10 @@ class S2ST(unittest.TestCase):
         self.assertTrue(os.path.exists(path_2))
         self.assertEqual(path_2, "tmp/Mein Woerter-Bilderbuch Unser Zuhause_9.mp3")
 
+    def test_make_batches(self):
+        batches = s2st.make_batches([10, 40, 12, 2, 38, 11], batch_size=2, max_batch_duration=60)
+        self.assertEqual(batches, [[1], [4], [2, 5], [0, 3]])
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=3)